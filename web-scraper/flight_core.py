@@ -0,0 +1,410 @@
+import asyncio
+import base64
+import json
+import os
+import re
+import signal
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit, quote
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+if TYPE_CHECKING:
+    import httpx
+    from playwright.async_api import Locator, Page
+
+# Shared by flight_scraper.py, flight_scraper_proxy.py and google_flights_client.py
+
+# --- TYPE DEFINITIONS ---
+FlightInfo = Dict[str, str]
+ReturnFlightInfo = FlightInfo
+RoundTripOption = Dict[str, Any]
+FinalFlightData = List[RoundTripOption]
+SearchQuery = Dict[str, Any]
+# --- END TYPE DEFINITIONS ---
+
+# ----------------------------
+# 1. URL BUILDER CLASS (Fixed for Round Trip)
+# ----------------------------
+
+class FlightURLBuilder:
+    """Class to handle round-trip flight URL creation with base64 encoding."""
+    
+    @staticmethod
+    def _create_round_trip_bytes(departure: str, destination: str, departure_date: str, return_date: str) -> bytes:
+        """Create bytes for round-trip flight."""
+        return (
+            b'\x08\x1e\x10\x02\x1a\x1e\x12\n' + departure_date.encode() +
+            b'*\x0e\x12\x0c\n\n' + return_date.encode() + 
+            b'j\x07\x08\x01\x12\x03' + departure.encode() +
+            b'r\x07\x08\x01\x12\x03' + destination.encode() +
+            b'@\x01H\x01p\x01\x82\x01\x0b\x08\xfc\x06`\x04\x08'
+        )
+    
+    @staticmethod
+    def _modify_base64(encoded: bytes) -> bytes:
+        """Add underscores at the specific position in base64 output."""
+        insert_index = len(encoded) - 6
+        return b''.join((encoded[:insert_index], b'_______', encoded[insert_index:]))
+
+    @classmethod
+    def build_round_trip_url(cls, departure: str, destination: str, departure_date: str, return_date: str) -> str:
+        """Build a round-trip Google Flights URL."""
+        flight_bytes = cls._create_round_trip_bytes(departure, destination, departure_date, return_date)
+        # Base64 output is ASCII, so it stays bytes until the single decode below
+        if len(flight_bytes) == len(_ROUND_TRIP_TEMPLATE):
+            # Usual YYYY-MM-DD dates and IATA codes: only the variable middle needs encoding
+            middle = base64.b64encode(flight_bytes[_ROUND_TRIP_HEAD_LEN:_ROUND_TRIP_TAIL_START])
+            modified = b''.join((_ROUND_TRIP_HEAD_B64, middle, _ROUND_TRIP_TAIL_B64))
+        else:
+            modified = cls._modify_base64(base64.b64encode(flight_bytes))
+        return f'https://www.google.com/travel/flights/search?tfs={modified.decode("ascii")}'
+
+# With 10-character dates and 3-letter airport codes the first 6 and last 13 bytes of the search message
+# never change and sit on base64 group boundaries, so their encodings (underscores included) are computed once
+_ROUND_TRIP_TEMPLATE = FlightURLBuilder._create_round_trip_bytes("AAA", "AAA", "0000-00-00", "0000-00-00")
+_ROUND_TRIP_HEAD_LEN = 6
+_ROUND_TRIP_TAIL_START = 54
+_ROUND_TRIP_HEAD_B64 = base64.b64encode(_ROUND_TRIP_TEMPLATE[:_ROUND_TRIP_HEAD_LEN])
+_ROUND_TRIP_TAIL_B64 = FlightURLBuilder._modify_base64(base64.b64encode(_ROUND_TRIP_TEMPLATE[_ROUND_TRIP_TAIL_START:]))
+
+# ----------------------------
+# 2. PROXY AND HTTP CLIENT
+# ----------------------------
+
+class ProxyConfig:
+    """Class to handle proxy configuration from environment variables."""
+    def __init__(self):
+        self.server = os.getenv('PROXY_SERVER')
+        self.username = os.getenv('PROXY_USERNAME')
+        self.password = os.getenv('PROXY_PASSWORD')
+        self.bypass = os.getenv('PROXY_BYPASS')
+    
+    def get_proxy_settings(self) -> Optional[Dict]:
+        if not self.server: 
+            return None
+        proxy_settings = {"server": self.server}
+        if self.username and self.password:
+            proxy_settings.update({"username": self.username, "password": self.password})
+        if self.bypass:
+            proxy_settings["bypass"] = self.bypass
+        return proxy_settings
+    
+    def get_proxy_url(self) -> Optional[str]:
+        """Return the proxy as a single URL with embedded credentials, for HTTP clients."""
+        if not self.server:
+            return None
+        parts = urlsplit(self.server if "://" in self.server else f"http://{self.server}")
+        if self.username and self.password:
+            parts = parts._replace(netloc=f"{quote(self.username, safe='')}:{quote(self.password, safe='')}@{parts.netloc}")
+        return urlunsplit(parts)
+    
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.server)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# One pool of keep-alive connections shared by every HTTP request in a run
+HTTP_CLIENT_LIMITS = {"max_connections": 50, "max_keepalive_connections": 20}
+
+def create_http_client(proxy_config: Optional[ProxyConfig] = None) -> "httpx.AsyncClient":
+    """Create the pooled HTTP client for requests made outside the browser, so TLS handshakes are paid once per host."""
+    # Imported here so the browser-only scraper can use this module without httpx installed
+    import httpx
+    proxy_url = proxy_config.get_proxy_url() if proxy_config else None
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.9"},
+        limits=httpx.Limits(**HTTP_CLIENT_LIMITS),
+        timeout=20.0,
+        follow_redirects=True,
+        proxy=proxy_url
+    )
+
+# ----------------------------
+# 3. FLIGHT CARD EXTRACTION
+# ----------------------------
+
+# Flight cards, in both the outbound and the return list
+OUTBOUND_FLIGHT_SELECTOR = ".pIav2d"
+
+# Field name -> selector inside a single flight card
+FLIGHT_FIELD_SELECTORS = {
+    "Departure Time": 'span[aria-label^="Departure time"]',
+    "Arrival Time": 'span[aria-label^="Arrival time"]',
+    "Airline Company": ".sSHqwe",
+    "Flight Duration": "div.gvkrdb",
+    "Stops": "div.EfT7Ae span.ogfYpf",
+    "Price": "div.FpEdX span",
+    "co2 emissions": "div.O7CXue",
+    "emissions variation": "div.N6PNV"
+}
+
+# Runs in the browser so every field of a card is read in one round-trip
+FLIGHT_INFO_JS = """(el, fields) => Object.fromEntries(
+    Object.entries(fields).map(([name, selector]) => {
+        const node = el.querySelector(selector);
+        return [name, node ? node.innerText : "N/A"];
+    })
+)"""
+FLIGHT_LIST_JS = f"(els, fields) => els.map(el => ({FLIGHT_INFO_JS})(el, fields))"
+
+# Analytics and ad hosts whose scripts the results page does not need
+BLOCKED_DOMAINS = ("googletagmanager.com", "doubleclick.net", "google-analytics.com", "googleadservices.com")
+
+async def scrape_flight_info(flight: "Locator", fields: Dict[str, str] = FLIGHT_FIELD_SELECTORS) -> FlightInfo:
+    """Extract the given fields from a single flight card in one round trip."""
+    return await flight.evaluate(FLIGHT_INFO_JS, fields)
+
+# Fields that identify a flight option, and the selectors that read just those
+FINGERPRINT_FIELDS = ("Airline Company", "Departure Time", "Arrival Time", "Price")
+FINGERPRINT_SELECTORS = {name: FLIGHT_FIELD_SELECTORS[name] for name in FINGERPRINT_FIELDS}
+
+def flight_fingerprint(flight_info: FlightInfo) -> tuple:
+    """Key identifying a flight option regardless of minor layout differences between cards."""
+    # Whitespace is normalised so cards read in the page and parsed from HTML compare equal
+    return tuple(" ".join(flight_info.get(name, "N/A").split()) for name in FINGERPRINT_FIELDS)
+
+async def find_previewed_card(cards: "Locator", i: int, fingerprint: tuple) -> Optional["Locator"]:
+    """
+    Return the card with the given fingerprint, checking position i first. A page that loaded the results
+    on its own may order the cards differently from the page the previews came from.
+    """
+    if i < await cards.count():
+        card = cards.nth(i)
+        if flight_fingerprint(await scrape_flight_info(card, FINGERPRINT_SELECTORS)) == fingerprint:
+            return card
+    current_previews = await cards.evaluate_all(FLIGHT_LIST_JS, FINGERPRINT_SELECTORS)
+    for n, info in enumerate(current_previews):
+        if flight_fingerprint(info) == fingerprint:
+            return cards.nth(n)
+    return None
+
+# Runs of source-formatting whitespace, which innerText collapses but selectolax's text() keeps
+_MARKUP_WHITESPACE = re.compile(r'[ \t\r\n]+')
+
+def parse_flight_cards(html: str, selector: str = OUTBOUND_FLIGHT_SELECTOR) -> List[FlightInfo]:
+    """
+    Extract the fields of every flight card in an HTML snippet without a browser, using the same selectors.
+    Whitespace is collapsed the way innerText does, so the values match cards read with FLIGHT_INFO_JS.
+    Needs selectolax; callers with a browser fallback check HTMLParser is not None first.
+    """
+    if HTMLParser is None:
+        raise ImportError("parse_flight_cards needs selectolax")
+    tree = HTMLParser(html)
+    flights = []
+    for card in tree.css(selector):
+        flight_info = {}
+        for name, field_selector in FLIGHT_FIELD_SELECTORS.items():
+            node = card.css_first(field_selector)
+            flight_info[name] = _MARKUP_WHITESPACE.sub(' ', node.text()).strip() if node else "N/A"
+        flights.append(flight_info)
+    return flights
+
+# ----------------------------
+# 4. SHARED BROWSER
+# ----------------------------
+
+# Headless Chromium, without the automation fingerprint, /dev/shm limits and subsystems a scraper never uses
+BROWSER_LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    # Chromium honours only the last --disable-features flag, so every feature goes in this one
+    "--disable-features=IsolateOrigins,site-per-process,Translate"
+]
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+# Set HEADED=1 (or DEBUG_BROWSER=1) to watch the scrape in a visible window
+HEADLESS = not (_env_flag('HEADED') or _env_flag('DEBUG_BROWSER'))
+
+async def new_browser_context(browser):
+    """Open an isolated context with the scraper's viewport and user agent."""
+    return await browser.new_context(viewport={"width": 1280, "height": 900}, user_agent=USER_AGENT)
+
+# How long Chromium gets to shut down gracefully before the driver is stopped underneath it
+BROWSER_CLOSE_GRACE_SECONDS = 3
+
+class BrowserPool:
+    """Playwright driver and browser launched once per process; every scrape works in its own fresh contexts."""
+    def __init__(self):
+        self.playwright = None
+        self.browser = None
+        self._lock = asyncio.Lock()
+
+    async def get_browser(self):
+        """Launch the browser, with optional proxy, on first use."""
+        async with self._lock:
+            if self.browser is None:
+                # Imported here so the HTTP-only client can use this module without Playwright installed
+                from playwright.async_api import async_playwright
+                self.playwright = await async_playwright().start()
+                browser_settings = {"headless": HEADLESS, "args": BROWSER_LAUNCH_ARGS}
+                proxy_settings = ProxyConfig().get_proxy_settings()
+                if proxy_settings:
+                    browser_settings["proxy"] = proxy_settings
+                self.browser = await self.playwright.chromium.launch(**browser_settings)
+            return self.browser
+
+    @asynccontextmanager
+    async def new_context(self):
+        """Yield a fresh context on the shared browser; only the context is closed afterwards."""
+        context = await new_browser_context(await self.get_browser())
+        try:
+            yield context
+        finally:
+            await context.close()
+
+    async def close(self) -> None:
+        """Close the browser within a grace period, then stop the driver, which kills anything left behind."""
+        try:
+            if self.browser:
+                await asyncio.wait_for(self.browser.close(), BROWSER_CLOSE_GRACE_SECONDS)
+        except Exception as e:
+            print(f"Browser did not close cleanly, stopping the driver: {e!r}")
+        finally:
+            self.browser = None
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
+
+BROWSER_POOL = BrowserPool()
+
+# Resource types that never feed the scraped flight text (tracker hosts are in BLOCKED_DOMAINS)
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet", "beacon", "websocket", "other", "imageset", "texttrack", "csp_report"}
+
+def should_block(request) -> bool:
+    """Check whether a request is an asset or tracker the scraper never reads."""
+    host = urlsplit(request.url).hostname or ""
+    return request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_DOMAINS)
+
+async def block_unused_resources(target) -> None:
+    """Abort requests for assets and trackers on a page, or on every page of a context; both expose route()."""
+    await target.route("**/*", lambda route: route.abort() if should_block(route.request) else route.continue_())
+
+async def run_and_shutdown(coro):
+    """
+    Await a scrape, then close the shared browser on the same event loop it was launched on.
+    SIGINT and SIGTERM cancel the scrape so the browser is still torn down instead of left running.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    interrupted = []
+    def on_signal() -> None:
+        interrupted.append(True)
+        task.cancel()
+    handled_signals = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+            handled_signals.append(sig)
+        except NotImplementedError:
+            pass  # Not supported by the Windows event loop
+    try:
+        return await coro
+    except asyncio.CancelledError:
+        if not interrupted:
+            raise
+        print("Interrupted, shutting down the browser...")
+        return None
+    finally:
+        for sig in handled_signals:
+            loop.remove_signal_handler(sig)
+        await BROWSER_POOL.close()
+
+# ----------------------------
+# 5. RETURN-FLIGHT PANEL
+# ----------------------------
+
+# How long each way of closing the return-flight panel gets to restore the results URL before the next is tried
+PANEL_CLOSE_CHECK_MS = 500
+
+# Ways to close the panel in place, cheapest first
+PANEL_CLOSE_METHODS = {
+    "escape": lambda page: page.keyboard.press("Escape"),
+    "close_button": lambda page: page.locator('button[aria-label="Close"]').first.click(timeout=PANEL_CLOSE_CHECK_MS),
+    "back": lambda page: page.go_back(wait_until="commit", timeout=PANEL_CLOSE_CHECK_MS),
+}
+
+# The method that last closed the panel on each page, tried first next time
+_last_panel_close: "weakref.WeakKeyDictionary[Page, str]" = weakref.WeakKeyDictionary()
+
+async def wait_for_flight_results(page: "Page", selector: str = OUTBOUND_FLIGHT_SELECTOR, timeout: float = 20000) -> None:
+    """Wait until the flight list is populated instead of waiting for the network to go idle."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    await page.wait_for_selector(selector, state='attached', timeout=timeout)
+    try:
+        # A second card means the list has rendered past its first placeholder
+        await page.wait_for_function(
+            "([sel, n]) => document.querySelectorAll(sel).length >= n", arg=[selector, 2], timeout=5000
+        )
+    except PlaywrightTimeoutError:
+        # Searches with a single result never render a second card
+        pass
+
+async def close_return_panel(page: "Page", results_url: str) -> bool:
+    """Close the return-flight panel without reloading, returning whether the page is back on results_url."""
+    last = _last_panel_close.get(page)
+    for name in sorted(PANEL_CLOSE_METHODS, key=lambda name: name != last):
+        try:
+            await PANEL_CLOSE_METHODS[name](page)
+            await page.wait_for_url(results_url, timeout=PANEL_CLOSE_CHECK_MS)
+        except Exception:
+            continue
+        _last_panel_close[page] = name
+        return True
+    return False
+
+async def show_outbound_results(page: "Page", results_url: str, selector: str = OUTBOUND_FLIGHT_SELECTOR) -> None:
+    """Bring a page to the outbound results, closing a return-flight panel instead of reloading when possible."""
+    if page.url == results_url:
+        return
+    # Only a page already on Google Flights can have a panel to close; a fresh tab goes straight to the reload
+    if page.url.startswith("https://www.google.com/travel/flights") and await close_return_panel(page, results_url):
+        try:
+            await wait_for_flight_results(page, selector, timeout=10000)
+            return
+        except Exception:
+            pass
+        print("   -> Results did not come back after closing the return flights, reloading...")
+    await page.goto(results_url, wait_until='domcontentloaded')
+    await wait_for_flight_results(page, selector)
+
+# ----------------------------
+# 6. JSON OUTPUT
+# ----------------------------
+
+# orjson parses and encodes in C; stdlib json accepts the same bytes input
+json_loads = orjson.loads if orjson is not None else json.loads
+
+def dump_json_line(record: Any) -> bytes:
+    """Encode a record as one compact JSON line, using orjson's C encoder when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+def write_json(data: Any, filename: str) -> None:
+    """Write data as indented JSON, using orjson's C encoder when it is installed."""
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
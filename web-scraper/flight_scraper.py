@@ -1,98 +1,115 @@
 import asyncio
-import csv
+import hashlib
 import os
-import base64
+import time
 import json
-import re
-from typing import List, Dict, Optional, Any
-import pandas as pd
-from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
-
-# --- TYPE DEFINITIONS ---
-ReturnFlightInfo = Dict[str, str]
-RoundTripOption = Dict[str, Any]
-FinalFlightData = List[RoundTripOption]
-# --- END TYPE DEFINITIONS ---
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Tuple
+from playwright.async_api import expect, Page, Locator, TimeoutError as PlaywrightTimeoutError
+from flight_core import (
+    OUTBOUND_FLIGHT_SELECTOR, FLIGHT_FIELD_SELECTORS, FLIGHT_LIST_JS,
+    BROWSER_POOL, run_and_shutdown, block_unused_resources, show_outbound_results,
+    flight_fingerprint, find_previewed_card,
+    HTMLParser, parse_flight_cards, json_loads, dump_json_line, write_json,
+    ReturnFlightInfo, RoundTripOption, FinalFlightData, SearchQuery
+)
 
 # ----------------------------
 # 1. PROXY AND SETUP FUNCTIONS
 # ----------------------------
 
-class ProxyConfig:
-    """Class to handle proxy configuration from environment variables."""
-    def __init__(self):
-        self.server = os.getenv('PROXY_SERVER')
-        self.username = os.getenv('PROXY_USERNAME')
-        self.password = os.getenv('PROXY_PASSWORD')
-        self.bypass = os.getenv('PROXY_BYPASS')
-    
-    def get_proxy_settings(self) -> Optional[Dict]:
-        if not self.server: 
-            return None
-        proxy_settings = {"server": self.server}
-        if self.username and self.password:
-            proxy_settings.update({"username": self.username, "password": self.password})
-        if self.bypass:
-            proxy_settings["bypass"] = self.bypass
-        return proxy_settings
-    
-    @property
-    def is_configured(self) -> bool:
-        return bool(self.server)
-
-async def setup_browser():
-    """Initialize and return browser and page objects with optional proxy."""
-    p = await async_playwright().start()
-    browser_settings = {"headless": False}
-    proxy_config = ProxyConfig()
-    if proxy_config.is_configured:
-        proxy_settings = proxy_config.get_proxy_settings()
-        if proxy_settings:
-            browser_settings["proxy"] = proxy_settings
-    browser = await p.chromium.launch(**browser_settings)
-    
-    # Create incognito context (equivalent to incognito mode)
-    context = await browser.new_context(
-        viewport={"width": 1280, "height": 900},
-        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    )
-    page = await context.new_page()
-    return p, browser, page
-
-async def extract_flight_element_text(flight, selector: str, aria_label: Optional[str] = None) -> str:
-    """Extract text from a flight element using selector and optional aria-label."""
-    if aria_label:
-        element = await flight.query_selector(f':scope {selector}[aria-label*="{aria_label}"]')
-    else:
-        element = await flight.query_selector(f':scope {selector}')
-    return await element.inner_text() if element else "N/A"
-
-async def scrape_flight_info(flight) -> Dict[str, str]:
-    """Extract all relevant information from a single flight element."""
-    departure_time = await extract_flight_element_text(flight, 'span', "Departure time")
-    arrival_time = await extract_flight_element_text(flight, 'span', "Arrival time")
-    airline = await extract_flight_element_text(flight, ".sSHqwe")
-    duration = await extract_flight_element_text(flight, "div.gvkrdb")
-    stops = await extract_flight_element_text(flight, "div.EfT7Ae span.ogfYpf")
-    price = await extract_flight_element_text(flight, "div.FpEdX span")
-    co2_emissions = await extract_flight_element_text(flight, "div.O7CXue")
-    emissions_variation = await extract_flight_element_text(flight, "div.N6PNV")
-    
-    return {
-        "Departure Time": departure_time,
-        "Arrival Time": arrival_time,
-        "Airline Company": airline,
-        "Flight Duration": duration,
-        "Stops": stops,
-        "Price": price,
-        "co2 emissions": co2_emissions,
-        "emissions variation": emissions_variation
-    }
+# Seconds to keep a finished page open for manual inspection (debugging only)
+INSPECT_SECONDS = int(os.getenv('INSPECT_SECONDS', '0'))
+
+async def pause_for_inspection(page: Page) -> None:
+    if INSPECT_SECONDS > 0:
+        print(f"Keeping browser open for {INSPECT_SECONDS} seconds for inspection...")
+        await page.wait_for_timeout(INSPECT_SECONDS * 1000)
 
 # ----------------------------
 # 2. DYNAMIC FORM FILLING (Your Current Approach)
 # ----------------------------
 
+async def select_first_suggestion(page: Page, label: str) -> None:
+    """Pick the first autocomplete suggestion (or press Enter if none shows) and wait for the list to close."""
+    first_option = page.locator("div[role='option']").first
+    try:
+        await first_option.wait_for(state="visible", timeout=5000)
+        await first_option.click()
+        print(f"✅ Selected first {label} suggestion")
+    except:
+        print(f"⚠️ No suggestions found, using Enter key for {label}")
+        await page.keyboard.press("Enter")
+    try:
+        await first_option.wait_for(state="hidden", timeout=3000)
+    except PlaywrightTimeoutError:
+        pass
+
+# Assigns an input's value and fires the events the date picker listens for
+SET_INPUT_VALUE_JS = """(el, value) => {
+    el.focus();
+    el.value = value;
+    el.dispatchEvent(new Event("input", {bubbles: true}));
+    el.dispatchEvent(new Event("change", {bubbles: true}));
+    el.blur();
+}"""
+
+# How long the date picker gets to reformat a date it accepted
+DATE_COMMIT_TIMEOUT_MS = 1500
+
+async def committed_date_value(field: Locator, date: str) -> Optional[str]:
+    """
+    Wait for the app to replace the raw date with its own display format (e.g. "Sun, Dec 7"), which only
+    happens once the picker has accepted it. Returns the display value, or None if the date did not stick.
+    """
+    try:
+        await expect(field).not_to_have_value(date, timeout=DATE_COMMIT_TIMEOUT_MS)
+    except AssertionError:
+        return None
+    value = (await field.input_value()).strip()
+    return value or None
+
+async def fill_date_field(page: Page, field: Locator, date: str, label: str) -> bool:
+    """Set a date input in one call, falling back to typing it when the picker does not accept the value."""
+    try:
+        await field.evaluate(SET_INPUT_VALUE_JS, date)
+        value = await committed_date_value(field, date)
+        if value:
+            print(f"✅ Set {label} date: {value}")
+            return True
+        print(f"⚠️ Picker ignored the direct {label} date assignment, typing it instead...")
+    except Exception as e:
+        print(f"⚠️ Direct {label} date assignment failed: {e}")
+    
+    # Try multiple methods to set the date reliably
+    for attempt in range(3):
+        try:
+            await field.click()
+            
+            if attempt < 2:
+                # Method 1: Clear and type
+                await field.fill("")
+                await field.type(date, delay=50)
+            else:
+                # Last attempt, try keyboard method
+                await page.keyboard.press("Control+a")
+                await page.keyboard.type(date, delay=100)
+            # Enter commits the typed date, which the picker then reformats
+            await page.keyboard.press("Enter")
+            
+            value = await committed_date_value(field, date)
+            if value:
+                print(f"✅ Set {label} date (attempt {attempt + 1}): {value}")
+                return True
+            print(f"⚠️ {label.capitalize()} date not accepted after attempt {attempt + 1}, retrying...")
+                    
+        except Exception as e:
+            print(f"⚠️ Error setting {label} date attempt {attempt + 1}: {e}")
+    
+    print(f"❌ Failed to set {label} date after 3 attempts")
+    return False
+
 async def dynamic_form_fill(page: Page, departure: str, destination: str, departure_date: str, return_date: str, passengers: int = 2) -> bool:
     """Fill form using dynamic approach that works with any destination."""
     
@@ -100,8 +117,8 @@ async def dynamic_form_fill(page: Page, departure: str, destination: str, depart
     
     try:
         # Navigate to Google Flights
-        await page.goto("https://www.google.com/travel/flights")
-        await page.wait_for_load_state('networkidle', timeout=15000)
+        await page.goto("https://www.google.com/travel/flights", wait_until="domcontentloaded")
+        await page.get_by_role("combobox", name="Where from?").wait_for(state="visible", timeout=15000)
         print("✅ Navigated to Google Flights")
         
         # Set passengers (if more than 1)
@@ -110,132 +127,48 @@ async def dynamic_form_fill(page: Page, departure: str, destination: str, depart
             await page.get_by_label("1 passenger, change number of").click()
             
             # Add adults (passengers - 1 since we start with 1)
+            add_adult_button = page.get_by_role("button", name="Add adult")
             for i in range(passengers - 1):
-                await page.get_by_role("button", name="Add adult").click()
-                await page.wait_for_timeout(200)
+                await add_adult_button.click()
             
-            await page.get_by_role("button", name="Done").click()
-            await page.wait_for_timeout(1000)
+            done_button = page.get_by_role("button", name="Done")
+            await done_button.click()
+            await done_button.wait_for(state="hidden")
             print(f"✅ Set to {passengers} passengers")
         
         # Fill departure location
         print(f"Setting departure: {departure}")
         await page.get_by_role("combobox", name="Where from?").click()
-        await page.wait_for_timeout(500)
-        
         await page.get_by_role("combobox", name="Where else?").fill(departure)
-        
-        # Wait for suggestions to appear before trying to click
-        try:
-            await page.wait_for_selector("div[role='option']", timeout=5000)
-            await page.wait_for_timeout(500)  # Small delay for suggestions to fully load
-            await page.locator("div[role='option']").first.click()
-            print("✅ Selected first departure suggestion")
-        except:
-            print("⚠️ No suggestions found, using Enter key for departure")
-            await page.keyboard.press("Enter")
-        await page.wait_for_timeout(500)
+        await select_first_suggestion(page, "departure")
         
         # Fill destination location  
         print(f"Setting destination: {destination}")
         await page.get_by_role("combobox", name="Where to?").click()
-        await page.wait_for_timeout(500)
-        
         await page.get_by_role("combobox", name="Where to?").fill(destination)
-        
-        # Wait for suggestions to appear before trying to click
-        try:
-            await page.wait_for_selector("div[role='option']", timeout=5000)
-            await page.wait_for_timeout(500)  # Small delay for suggestions to fully load
-            await page.locator("div[role='option']").first.click()
-            print("✅ Selected first destination suggestion")
-        except:
-            print("⚠️ No suggestions found, using Enter key for destination")
-            await page.keyboard.press("Enter")
-        await page.wait_for_timeout(500)
+        await select_first_suggestion(page, "destination")
         
         # Set departure date
         print(f"Setting departure date: {departure_date}")
         departure_field = page.get_by_role("textbox", name="Departure")
-        
-        # Try multiple methods to set the date reliably
-        for attempt in range(3):
-            try:
-                await departure_field.click()
-                await page.wait_for_timeout(300)
-                
-                # Method 1: Clear and type
-                await departure_field.fill("")
-                await page.wait_for_timeout(200)
-                await departure_field.type(departure_date, delay=50)
-                await page.wait_for_timeout(500)
-                
-                # Check if field has any content (not empty)
-                departure_value = await departure_field.input_value()
-                if departure_value and len(departure_value.strip()) > 0:
-                    print(f"✅ Set departure date (attempt {attempt + 1}): {departure_value}")
-                    break
-                else:
-                    print(f"⚠️ Departure date empty after attempt {attempt + 1}, retrying...")
-                    if attempt == 2:  # Last attempt, try keyboard method
-                        await departure_field.click()
-                        await page.keyboard.press("Control+a")
-                        await page.keyboard.type(departure_date, delay=100)
-                        await page.wait_for_timeout(500)
-                        
-            except Exception as e:
-                print(f"⚠️ Error setting departure date attempt {attempt + 1}: {e}")
-                if attempt == 2:
-                    print("❌ Failed to set departure date after 3 attempts")
+        departure_set = await fill_date_field(page, departure_field, departure_date, "departure")
         
         # Set return date
         print(f"Setting return date: {return_date}")
         return_field = page.get_by_role("textbox", name="Return")
+        return_set = await fill_date_field(page, return_field, return_date, "return")
         
-        # Try multiple methods to set the date reliably
-        for attempt in range(3):
-            try:
-                await return_field.click()
-                await page.wait_for_timeout(300)
-                
-                # Method 1: Clear and type
-                await return_field.fill("")
-                await page.wait_for_timeout(200)
-                await return_field.type(return_date, delay=50)
-                await page.wait_for_timeout(500)
-                
-                # Check if field has any content (not empty)
-                return_value = await return_field.input_value()
-                if return_value and len(return_value.strip()) > 0:
-                    print(f"✅ Set return date (attempt {attempt + 1}): {return_value}")
-                    break
-                else:
-                    print(f"⚠️ Return date empty after attempt {attempt + 1}, retrying...")
-                    if attempt == 2:  # Last attempt, try keyboard method
-                        await return_field.click()
-                        await page.keyboard.press("Control+a")
-                        await page.keyboard.type(return_date, delay=100)
-                        await page.wait_for_timeout(500)
-                        
-            except Exception as e:
-                print(f"⚠️ Error setting return date attempt {attempt + 1}: {e}")
-                if attempt == 2:
-                    print("❌ Failed to set return date after 3 attempts")
-        
-        # Wait a moment for any field validation
-        await page.wait_for_timeout(1000)
-        
-        # Final verification - check both fields have content
-        final_dep_value = await departure_field.input_value()
-        final_ret_value = await return_field.input_value()
-        
-        if not final_dep_value or not final_ret_value:
+        # Final verification - searching with dates the picker never accepted would scrape the wrong days
+        if not departure_set or not return_set:
+            final_dep_value = await departure_field.input_value()
+            final_ret_value = await return_field.input_value()
             print(f"⚠️ Date field verification: Departure='{final_dep_value}', Return='{final_ret_value}'")
             return False  # Indicate form filling failed
         
         # Click Done for dates
-        await page.get_by_role("button", name="Done. Search for one-way").click()
-        await page.wait_for_timeout(500)
+        dates_done_button = page.get_by_role("button", name="Done. Search for one-way")
+        await dates_done_button.click()
+        await dates_done_button.wait_for(state="hidden")
         print("✅ Clicked Done for dates")
         
         # Search for flights
@@ -244,11 +177,8 @@ async def dynamic_form_fill(page: Page, departure: str, destination: str, depart
         print("✅ Clicked Search button")
         
         # Wait for flight results
-        await page.wait_for_load_state('networkidle', timeout=30000)
-        
-        # Check if we got flight results
         try:
-            await page.wait_for_selector(".pIav2d", timeout=15000)
+            await page.wait_for_selector(".pIav2d", timeout=30000)
             print("✅ SUCCESS: Flight results found!")
             return True
         except:
@@ -265,164 +195,317 @@ async def dynamic_form_fill(page: Page, departure: str, destination: str, depart
 # 3. ROUND-TRIP SCRAPING LOGIC (From Your GitHub - Fixed)
 # ----------------------------
 
-async def scrape_round_trip_data_dynamic(page: Page) -> FinalFlightData:
+# Define selectors
+RETURN_CONTAINER_SELECTOR = ".Rk10dc"  # Container that appears with return flights
+
+# Number of tabs scraping outbound flights at the same time
+MAX_CONCURRENCY = 4
+
+class PagePool:
+    """Fixed set of tabs in one browser context, lent out to concurrent scraping jobs."""
+    def __init__(self, context, size: int, initial_pages: Optional[List[Page]] = None, warm_url: Optional[str] = None):
+        self.context = context
+        self.size = size
+        self.initial_pages = initial_pages or []
+        self.warm_url = warm_url
+        self._pages: asyncio.Queue = asyncio.Queue()
+
+    async def _add_page(self) -> None:
+        """Open a tab, pre-load warm_url into it, and make it available to jobs."""
+        page = await self.context.new_page()
+        if self.warm_url:
+            try:
+                await show_outbound_results(page, self.warm_url)
+            except Exception as e:
+                print(f"   -> Could not pre-load results in a new tab: {e}")
+        self._pages.put_nowait(page)
+
+    async def start(self) -> None:
+        for page in self.initial_pages[:self.size]:
+            self._pages.put_nowait(page)
+        # Open and warm the remaining tabs in parallel; each joins the pool as soon as it is ready
+        await asyncio.gather(*(self._add_page() for _ in range(self.size - self._pages.qsize())))
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a tab, waiting for one to be returned if all are busy."""
+        page = await self._pages.get()
+        try:
+            yield page
+        finally:
+            self._pages.put_nowait(page)
+
+async def scrape_outbound_option(page: Page, base_url: str, i: int, outbound_count: int, outbound_info: ReturnFlightInfo) -> Tuple[Optional[RoundTripOption], bool]:
     """
-    Scrapes round-trip data by clicking outbound flights and recording return options.
-    Uses a more robust approach without excessive reloading.
+    Show the results on the given tab, click the i-th outbound flight and record its return options.
+    Returns the option (None if the flight has none) and whether the flight was scraped without failing.
     """
-    final_data: FinalFlightData = []
+    print(f"Processing outbound flight {i+1} of {outbound_count}...")
     
-    # Define selectors
-    OUTBOUND_FLIGHT_SELECTOR = ".pIav2d" 
-    RETURN_CONTAINER_SELECTOR = ".Rk10dc"  # Container that appears with return flights
+    try:
+        # Get this tab onto the outbound list
+        await show_outbound_results(page, base_url)
+        
+        # This tab loaded the results on its own, so the i-th card may not be the previewed flight
+        outbound_element = await find_previewed_card(page.locator(OUTBOUND_FLIGHT_SELECTOR), i, flight_fingerprint(outbound_info))
+        if outbound_element is None:
+            print(f"   -> Flight {i+1} is no longer listed on this tab, skipping...")
+            return None, True
+        
+        # Scroll to element
+        await outbound_element.scroll_into_view_if_needed()
+        
+        # Click to reveal return flights
+        await outbound_element.click(force=True)
+        
+        # Wait for return flight container to appear
+        try:
+            await page.wait_for_selector(RETURN_CONTAINER_SELECTOR, timeout=10000)
+            print(f"   -> Return flights container appeared for flight {i+1}")
+            
+            # Wait for the first return flight to render inside the container
+            return_flight_selector = f"{RETURN_CONTAINER_SELECTOR} {OUTBOUND_FLIGHT_SELECTOR}"
+            try:
+                await page.locator(return_flight_selector).first.wait_for(state="visible", timeout=5000)
+            except PlaywrightTimeoutError:
+                pass  # Handled by the broader selector fallback below
+            
+            # Pull the container's markup once and parse the return flights in-process,
+            # or read the cards in the page when selectolax is not installed
+            if HTMLParser is not None:
+                container_html = await page.locator(RETURN_CONTAINER_SELECTOR).first.inner_html()
+                return_infos = parse_flight_cards(container_html, OUTBOUND_FLIGHT_SELECTOR)
+            else:
+                return_infos = await page.locator(return_flight_selector).evaluate_all(FLIGHT_LIST_JS, FLIGHT_FIELD_SELECTORS)
+            
+            if not return_infos:
+                # Fallback: try broader selector
+                return_infos = await page.locator(OUTBOUND_FLIGHT_SELECTOR).evaluate_all(FLIGHT_LIST_JS, FLIGHT_FIELD_SELECTORS)
+                # Filter to only get the new ones (return flights)
+                return_infos = return_infos[outbound_count:]
+            
+            # Drop duplicate return cards and any copy of the outbound flight
+            return_seen = {flight_fingerprint(outbound_info)}
+            return_flights_data: List[ReturnFlightInfo] = []
+            for return_info in return_infos:
+                return_fingerprint = flight_fingerprint(return_info)
+                if return_fingerprint not in return_seen:
+                    return_seen.add(return_fingerprint)
+                    return_flights_data.append(return_info)
+            
+            # Return the combined data
+            if return_flights_data:
+                print(f"   -> SUCCESS: Found and saved {len(return_flights_data)} return flights for flight {i+1}.")
+                return {
+                    "OutboundFlight": outbound_info,
+                    "ReturnFlights": return_flights_data
+                }, True
+            print(f"   -> No valid return flights found for flight {i+1}")
+            return None, True
+        
+        except PlaywrightTimeoutError:
+            print(f"   -> TIMEOUT waiting for return flights container on flight {i+1}")
+            return None, False
+            
+    except Exception as e:
+        print(f"   -> Error processing flight {i+1}: {e}")
+        return None, False
+
+def load_checkpoint(path: str) -> FinalFlightData:
+    """
+    Read the round-trip options already written to a checkpoint file, skipping a torn last line.
+    A checkpoint last written longer ago than a finished result stays cached is deleted instead, since its prices are stale.
+    """
+    records: FinalFlightData = []
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return records
+    if age > RESULT_CACHE_TTL_SECONDS:
+        print(f"Discarding stale checkpoint {path} ({int(age)}s old)")
+        os.remove(path)
+        return records
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(json_loads(line))
+            except ValueError:
+                continue
+    return records
+
+def append_checkpoint(f, record: RoundTripOption) -> None:
+    """Append one round-trip option as a JSON line and force it to disk."""
+    f.write(dump_json_line(record))
+    f.flush()
+    os.fsync(f.fileno())
+
+async def scrape_round_trip_data_dynamic(page: Page, checkpoint_path: Optional[str] = None) -> Tuple[FinalFlightData, bool]:
+    """
+    Scrapes round-trip data by clicking outbound flights and recording return options.
+    Outbound flights are scraped concurrently on a pool of MAX_CONCURRENCY tabs, each loading the results once
+    and closing the return-flight panel between flights.
+    With a checkpoint_path, each option is appended there as it completes and a restarted run skips those flights.
+    Returns the options together with whether every outbound flight was scraped successfully.
+    """
+    # Options finished by an earlier run are kept even if this run fails
+    resumed_data: FinalFlightData = load_checkpoint(checkpoint_path) if checkpoint_path else []
+    final_data: FinalFlightData = list(resumed_data)
+    checkpoint = None
     
     try:
         # Wait for the initial outbound flights to load
         await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=20000)
-        await page.wait_for_load_state('domcontentloaded')
         
-        # Get the count of outbound flights initially (limit to reasonable number)
-        outbound_flights_list = await page.query_selector_all(OUTBOUND_FLIGHT_SELECTOR)
-        initial_outbound_count = min(len(outbound_flights_list), 15)  # Limit to 15 for stability
-        print(f"Found {len(outbound_flights_list)} outbound flights, processing first {initial_outbound_count}...")
+        # Scrape every outbound card in one call (limit to reasonable number)
+        outbound_previews = await page.locator(OUTBOUND_FLIGHT_SELECTOR).evaluate_all(FLIGHT_LIST_JS, FLIGHT_FIELD_SELECTORS)
+        initial_outbound_count = min(len(outbound_previews), 15)  # Limit to 15 for stability
+        print(f"Found {len(outbound_previews)} outbound flights, processing first {initial_outbound_count}...")
 
-        # Store the base URL for reloading
+        # Store the base URL so every tab can load the same results
         base_url = page.url
 
-        # Loop through outbound flights
-        for i in range(initial_outbound_count):
-            print(f"Processing outbound flight {i+1} of {initial_outbound_count}...")
-            
-            try:
-                # Reload page for fresh state every few flights to prevent stale elements
-                if i > 0 and i % 5 == 0:
-                    print(f"   -> Refreshing page after {i} flights...")
-                    await page.goto(base_url)
-                    await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=15000)
-                    await page.wait_for_load_state('domcontentloaded')
-                
-                # Get current flight elements (refresh the list)
-                current_flights = await page.query_selector_all(OUTBOUND_FLIGHT_SELECTOR)
-                if i >= len(current_flights):
-                    print(f"   -> Flight {i+1} no longer available, skipping...")
-                    continue
-                
-                # Get the specific outbound flight
-                outbound_element = current_flights[i]
-                
-                # Scroll to element
-                await outbound_element.scroll_into_view_if_needed()
-                await page.wait_for_timeout(500)
-                
-                # Scrape outbound flight info BEFORE clicking
-                outbound_info = await scrape_flight_info(outbound_element)
-                
-                # Click to reveal return flights
-                await outbound_element.click(force=True)
-                
-                # Wait for return flight container to appear
-                try:
-                    await page.wait_for_selector(RETURN_CONTAINER_SELECTOR, timeout=10000)
-                    print(f"   -> Return flights container appeared")
-                    
-                    # Wait a bit for return flights to fully load
-                    await page.wait_for_timeout(1000)
-                    
-                    # Find return flights within the container
-                    return_flight_selector = f"{RETURN_CONTAINER_SELECTOR} .pIav2d"
-                    return_elements = await page.query_selector_all(return_flight_selector)
-                    
-                    if not return_elements:
-                        # Fallback: try broader selector
-                        return_elements = await page.query_selector_all(".pIav2d")
-                        # Filter to only get the new ones (return flights)
-                        return_elements = return_elements[initial_outbound_count:]
-                    
-                    return_flights_data: List[ReturnFlightInfo] = []
-                    
-                    for return_element in return_elements:
-                        try:
-                            return_info = await scrape_flight_info(return_element)
-                            # Simple check to avoid duplicating outbound flight data
-                            if return_info != outbound_info:
-                                return_flights_data.append(return_info)
-                        except Exception as e:
-                            print(f"     -> Error scraping return flight: {e}")
-                            continue
-                    
-                    # Store the combined data
-                    if return_flights_data:
-                        final_data.append({
-                            "OutboundFlight": outbound_info,
-                            "ReturnFlights": return_flights_data
-                        })
-                        print(f"   -> SUCCESS: Found and saved {len(return_flights_data)} return flights.")
-                    else:
-                        print(f"   -> No valid return flights found")
-                    
-                    # Close the return flight selection (try to find close button)
-                    try:
-                        await page.goto(base_url)
-                        await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=15000)
-                        await page.wait_for_load_state('domcontentloaded')
-                    except:
-                        # Fallback: reload page
-                        await page.goto(base_url)
-                        await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=15000)
-                        await page.wait_for_load_state('domcontentloaded')
-                
-                except PlaywrightTimeoutError:
-                    print(f"   -> TIMEOUT waiting for return flights container")
-                    continue
-                    
-            except Exception as e:
-                print(f"   -> Error processing flight {i+1}: {e}")
-                # Try to reload and continue
-                try:
-                    await page.goto(base_url)
-                    await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=15000)
-                    await page.wait_for_load_state('domcontentloaded')
-                except:
-                    print(f"   -> Could not recover from error, stopping")
-                    break
+        # Fingerprints of outbound flights already scraped or queued, including those finished by an earlier run
+        seen: set = {flight_fingerprint(option["OutboundFlight"]) for option in resumed_data}
+        if resumed_data:
+            print(f"Resuming: {len(resumed_data)} round-trip options already in {checkpoint_path}")
+        if checkpoint_path:
+            os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+            checkpoint = open(checkpoint_path, 'ab')
+
+        # Only click cards that are not near-duplicates of one already seen
+        pending = []
+        for i, outbound_info in enumerate(outbound_previews[:initial_outbound_count]):
+            fingerprint = flight_fingerprint(outbound_info)
+            if fingerprint in seen:
+                print(f"   -> Flight {i+1} duplicates an earlier option, skipping...")
                 continue
+            seen.add(fingerprint)
+            pending.append((i, outbound_info))
+
+        # The form-filled tab joins the pool alongside freshly opened ones
+        pool = PagePool(page.context, min(MAX_CONCURRENCY, max(len(pending), 1)), initial_pages=[page], warm_url=base_url)
+        # Jobs start on the form-filled tab while the other tabs are still warming up
+        warm_up = asyncio.create_task(pool.start())
+
+        async def run_job(i: int, outbound_info: ReturnFlightInfo) -> Tuple[Optional[RoundTripOption], bool]:
+            async with pool.page() as job_page:
+                option, finished = await scrape_outbound_option(job_page, base_url, i, initial_outbound_count, outbound_info)
+            if option and checkpoint:
+                append_checkpoint(checkpoint, option)
+            return option, finished
+
+        # Results come back in outbound order regardless of which tab finished first
+        outcomes = await asyncio.gather(*(run_job(i, outbound_info) for i, outbound_info in pending))
+        await warm_up
+        final_data = resumed_data + [option for option, _ in outcomes if option]
+        # A flight without return options still counts as done; only failed ones leave the scrape incomplete
+        complete = all(finished for _, finished in outcomes)
+
+        # Every flight finished: the caller caches the full result, so the partial results are no longer needed.
+        # Otherwise keep the checkpoint so a rerun retries only the flights that failed.
+        if checkpoint and complete:
+            checkpoint.close()
+            checkpoint = None
+            os.remove(checkpoint_path)
                 
         print(f"\nSuccessfully scraped {len(final_data)} complete round-trip options.")
-        return final_data
+        return final_data, complete
 
     except Exception as e:
         print(f"Error in round-trip scraping: {e}")
-        return final_data
+        return final_data, False
+
+    finally:
+        if checkpoint:
+            checkpoint.close()
 
 # ----------------------------
 # 4. MAIN SCRAPING LOGIC (Combined Approach)
 # ----------------------------
 
+# Where finished scrapes are cached; empty results expire sooner so transient failures are retried
+RESULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'results')
+RESULT_CACHE_TTL_SECONDS = 600
+EMPTY_RESULT_CACHE_TTL_SECONDS = 30
+# Partial results of in-progress scrapes, kept until the scrape finishes
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'checkpoints')
+
+def _cache_key(departure: str, destination: str, departure_date: str, return_date: str, passengers: int) -> str:
+    return f"rt:{departure}:{destination}:{departure_date}:{return_date}:{passengers}"
+
+def _cache_path(key: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+def _checkpoint_path(key: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.jsonl')
+
+def load_cached_result(key: str) -> Optional[FinalFlightData]:
+    """Return the cached scrape for key if it is still fresh, otherwise None."""
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        # Empty or partial scrapes expire quickly so the failed flights are retried
+        ttl = RESULT_CACHE_TTL_SECONDS if cached["data"] and cached["complete"] else EMPTY_RESULT_CACHE_TTL_SECONDS
+        if time.time() - cached["ts"] < ttl:
+            return cached["data"]
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        pass
+    return None
+
+def store_cached_result(key: str, data: FinalFlightData, complete: bool) -> None:
+    """Cache a scrape for key along with the time it was taken and whether every flight was scraped."""
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    with open(_cache_path(key), 'w', encoding='utf-8') as f:
+        json.dump({"ts": time.time(), "complete": complete, "data": data}, f)
+
 async def scrape_complete_round_trip_flights(departure: str, destination: str, departure_date: str, return_date: str, passengers: int = 2) -> FinalFlightData:
     """
     Complete round-trip flight scraper that combines dynamic form filling with round-trip scraping.
+    Recent results for the same search are served from the result cache without launching a browser.
     """
     
-    flight_data = []
-    playwright, browser, page = await setup_browser()
+    cache_key = _cache_key(departure, destination, departure_date, return_date, passengers)
+    cached_data = load_cached_result(cache_key)
+    if cached_data is not None:
+        print(f"✅ Using cached results for {departure} to {destination}")
+        return cached_data
     
-    try:
-        # Step 1: Fill the form using dynamic approach
-        success = await dynamic_form_fill(page, departure, destination, departure_date, return_date, passengers)
-        
-        if success:
-            # Step 2: Use round-trip scraping logic from GitHub
-            flight_data = await scrape_round_trip_data_dynamic(page)
-        else:
-            print("❌ Could not load flight results, skipping scraping")
-        
-        return flight_data
+    flight_data = []
+    complete = False
+    async with BROWSER_POOL.new_context() as context:
+        await block_unused_resources(context)
+        page = await context.new_page()
+        try:
+            # Step 1: Fill the form using dynamic approach
+            success = await dynamic_form_fill(page, departure, destination, departure_date, return_date, passengers)
+            
+            if success:
+                # Step 2: Use round-trip scraping logic from GitHub
+                flight_data, complete = await scrape_round_trip_data_dynamic(page, _checkpoint_path(cache_key))
+            else:
+                print("❌ Could not load flight results, skipping scraping")
+            
+            store_cached_result(cache_key, flight_data, complete)
+            return flight_data
 
-    finally:
-        print("Keeping browser open for 10 seconds for inspection...")
-        await page.wait_for_timeout(10000)
-        await browser.close()
-        await playwright.stop()
+        finally:
+            await pause_for_inspection(page)
+
+async def scrape_batch(queries: List[SearchQuery], max_concurrency: int = 3) -> List[Any]:
+    """
+    Run several round-trip searches concurrently on the shared browser, each in its own context.
+    Results are returned in query order; a failed search yields its exception instead of aborting the batch.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def run_query(query: SearchQuery) -> FinalFlightData:
+        async with sem:
+            return await scrape_complete_round_trip_flights(**query)
+
+    return await asyncio.gather(*(run_query(query) for query in queries), return_exceptions=True)
 
 # ----------------------------
 # 5. SIMPLIFIED FLIGHT SCRAPING (For One-Way or Flat Results)
@@ -438,18 +521,12 @@ async def scrape_all_visible_flights(page: Page) -> List[Dict[str, str]]:
         # Wait for flights to load
         await page.wait_for_selector(".pIav2d", timeout=15000)
         
-        # Get all flight elements
-        flight_elements = await page.query_selector_all(".pIav2d")
-        print(f"Found {len(flight_elements)} flights on the page")
+        # Extract every flight on the page in a single call
+        flight_data = await page.eval_on_selector_all(".pIav2d", FLIGHT_LIST_JS, FLIGHT_FIELD_SELECTORS)
+        print(f"Found {len(flight_data)} flights on the page")
         
-        # Scrape each flight
-        for i, flight_element in enumerate(flight_elements):
-            try:
-                flight_info = await scrape_flight_info(flight_element)
-                flight_data.append(flight_info)
-                print(f"  Flight {i+1}: {flight_info['Airline Company']} - {flight_info['Price']}")
-            except Exception as e:
-                print(f"  Error scraping flight {i+1}: {e}")
+        for i, flight_info in enumerate(flight_data):
+            print(f"  Flight {i+1}: {flight_info['Airline Company']} - {flight_info['Price']}")
                 
         return flight_data
         
@@ -457,31 +534,62 @@ async def scrape_all_visible_flights(page: Page) -> List[Dict[str, str]]:
         print(f"Error scraping flights: {e}")
         return flight_data
 
+async def scrape_via_http(departure: str, destination: str, departure_date: str, return_date: str, passengers: int) -> Optional[List[Dict[str, str]]]:
+    """
+    Fetch the visible outbound flights over plain HTTP, without a browser.
+    Returns None when the search cannot be expressed as a results URL or the page had no server-rendered flights.
+    """
+    # The results URL encodes one adult and airport codes only
+    if passengers != 1 or len(departure) != 3 or len(destination) != 3 or HTMLParser is None:
+        return None
+    # Imported here so a browser-only install (no httpx) still works
+    try:
+        from google_flights_client import search_round_trips
+    except ImportError:
+        return None
+    try:
+        query = {
+            "departure": departure,
+            "destination": destination,
+            "departure_date": datetime.strptime(departure_date, "%m/%d/%Y").strftime("%Y-%m-%d"),
+            "return_date": datetime.strptime(return_date, "%m/%d/%Y").strftime("%Y-%m-%d")
+        }
+        flights = (await search_round_trips([query]))[0]
+    except Exception as e:
+        print(f"⚠️ HTTP search failed, falling back to the browser: {e}")
+        return None
+    return flights or None
+
 async def scrape_simple_flights(departure: str, destination: str, departure_date: str, return_date: str, passengers: int = 2) -> List[Dict[str, str]]:
     """
     Simple flight scraper that gets all visible flights without opening modals.
+    Tries the HTTP client first and only launches a browser when it comes back empty.
+    The HTTP path only covers single-passenger searches, so the default of 2 always uses the browser.
     """
     
-    flight_data = []
-    playwright, browser, page = await setup_browser()
+    http_data = await scrape_via_http(departure, destination, departure_date, return_date, passengers)
+    if http_data:
+        print(f"✅ Found {len(http_data)} flights over HTTP")
+        return http_data
     
-    try:
-        # Step 1: Fill the form using dynamic approach
-        success = await dynamic_form_fill(page, departure, destination, departure_date, return_date, passengers)
-        
-        if success:
-            # Step 2: Scrape all visible flights on the page
-            flight_data = await scrape_all_visible_flights(page)
-        else:
-            print("❌ Could not load flight results, skipping scraping")
-        
-        return flight_data
+    flight_data = []
+    async with BROWSER_POOL.new_context() as context:
+        await block_unused_resources(context)
+        page = await context.new_page()
+        try:
+            # Step 1: Fill the form using dynamic approach
+            success = await dynamic_form_fill(page, departure, destination, departure_date, return_date, passengers)
+            
+            if success:
+                # Step 2: Scrape all visible flights on the page
+                flight_data = await scrape_all_visible_flights(page)
+            else:
+                print("❌ Could not load flight results, skipping scraping")
+            
+            return flight_data
 
-    finally:
-        print("Keeping browser open for 10 seconds for inspection...")
-        await page.wait_for_timeout(10000)
-        await browser.close()
-        await playwright.stop()
+        finally:
+            await pause_for_inspection(page)
 
 # ----------------------------
 # 6. DATA SAVING FUNCTIONS
@@ -490,8 +598,7 @@ async def scrape_simple_flights(departure: str, destination: str, departure_date
 def save_structured_data(data: FinalFlightData, filename: str) -> None:
     """Save the nested flight data structure as a JSON file."""
     if data:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
+        write_json(data, filename)
         print(f"Nested round-trip data saved to {filename}")
     else:
         print("No data was scraped to save.")
@@ -499,8 +606,7 @@ def save_structured_data(data: FinalFlightData, filename: str) -> None:
 def save_flight_data(data: List[Dict[str, str]], filename: str) -> None:
     """Save the flight data as a JSON file."""
     if data:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
+        write_json(data, filename)
         print(f"Flight data saved to {filename}")
     else:
         print("No data was scraped to save.")
@@ -517,7 +623,7 @@ if __name__ == "__main__":
     DESTINATION = "CUN"         
     DEPARTURE_DATE = "12/07/2025"
     RETURN_DATE = "12/12/2025"
-    PASSENGERS = 2
+    PASSENGERS = 2              # Simple mode only skips the browser for 1 passenger
     
     # Choose scraping mode
     USE_ROUND_TRIP_SCRAPING = True  # Set to False for simple visible flights only
@@ -531,13 +637,13 @@ if __name__ == "__main__":
     try:
         if USE_ROUND_TRIP_SCRAPING:
             # Use the round-trip scraping logic from GitHub
-            scraped_data = asyncio.run(scrape_complete_round_trip_flights(
+            scraped_data = asyncio.run(run_and_shutdown(scrape_complete_round_trip_flights(
                 departure=DEPARTURE,
                 destination=DESTINATION, 
                 departure_date=DEPARTURE_DATE,
                 return_date=RETURN_DATE,
                 passengers=PASSENGERS
-            ))
+            )))
             
             # Save the structured results
             if scraped_data:
@@ -558,13 +664,13 @@ if __name__ == "__main__":
         
         else:
             # Use simple visible flights scraping
-            scraped_data = asyncio.run(scrape_simple_flights(
+            scraped_data = asyncio.run(run_and_shutdown(scrape_simple_flights(
                 departure=DEPARTURE,
                 destination=DESTINATION, 
                 departure_date=DEPARTURE_DATE,
                 return_date=RETURN_DATE,
                 passengers=PASSENGERS
-            ))
+            )))
             
             # Save the results
             if scraped_data:
@@ -1,222 +1,490 @@
+import argparse
 import asyncio
 import csv
+import hashlib
 import os
-import base64
-import json
-from typing import List, Dict, Optional, Any
-import pandas as pd
-from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
-
-# --- TYPE DEFINITIONS ---
-ReturnFlightInfo = Dict[str, str]
-RoundTripOption = Dict[str, Any]
-FinalFlightData = List[RoundTripOption]
-# --- END TYPE DEFINITIONS ---
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import List, Dict, Optional, Any, AsyncIterator
+from playwright.async_api import Page, Locator, TimeoutError as PlaywrightTimeoutError
+from flight_core import (
+    FlightURLBuilder,
+    OUTBOUND_FLIGHT_SELECTOR, FLIGHT_FIELD_SELECTORS, FLIGHT_INFO_JS, FLIGHT_LIST_JS,
+    BROWSER_POOL, new_browser_context, run_and_shutdown, block_unused_resources,
+    wait_for_flight_results, show_outbound_results, flight_fingerprint, find_previewed_card, FINGERPRINT_SELECTORS, json_loads, dump_json_line, write_json,
+    ReturnFlightInfo, RoundTripOption, FinalFlightData
+)
 
 # ----------------------------
-# 1. URL BUILDER CLASS (Fixed for Round Trip)
+# 1. BROWSER AND SESSION SETUP
 # ----------------------------
 
-class FlightURLBuilder:
-    """Class to handle round-trip flight URL creation with base64 encoding."""
-    
-    @staticmethod
-    def _create_round_trip_bytes(departure: str, destination: str, departure_date: str, return_date: str) -> bytes:
-        """Create bytes for round-trip flight."""
-        return (
-            b'\x08\x1e\x10\x02\x1a\x1e\x12\n' + departure_date.encode() +
-            b'*\x0e\x12\x0c\n\n' + return_date.encode() + 
-            b'j\x07\x08\x01\x12\x03' + departure.encode() +
-            b'r\x07\x08\x01\x12\x03' + destination.encode() +
-            b'@\x01H\x01p\x01\x82\x01\x0b\x08\xfc\x06`\x04\x08'
-        )
-    
-    @staticmethod
-    def _modify_base64(encoded_str: str) -> str:
-        """Add underscores at the specific position in base64 string."""
-        insert_index = len(encoded_str) - 6
-        return encoded_str[:insert_index] + '_' * 7 + encoded_str[insert_index:]
-
-    @classmethod
-    def build_round_trip_url(cls, departure: str, destination: str, departure_date: str, return_date: str) -> str:
-        """Build a round-trip Google Flights URL."""
-        flight_bytes = cls._create_round_trip_bytes(departure, destination, departure_date, return_date)
-        base64_str = base64.b64encode(flight_bytes).decode('utf-8')
-        modified_str = cls._modify_base64(base64_str)
-        return f'https://www.google.com/travel/flights/search?tfs={modified_str}'
+# Defaults for every action and navigation, so calls only pass a timeout when they need a different one
+DEFAULT_TIMEOUT_MS = 15000
+DEFAULT_NAVIGATION_TIMEOUT_MS = 20000
 
-# ----------------------------
-# 2. PROXY AND SETUP FUNCTIONS
-# ----------------------------
+async def new_scraper_context(browser):
+    """Open an isolated context on the shared browser with the scraper's default timeouts."""
+    context = await new_browser_context(browser)
+    context.set_default_timeout(DEFAULT_TIMEOUT_MS)
+    context.set_default_navigation_timeout(DEFAULT_NAVIGATION_TIMEOUT_MS)
+    return context
+
+async def block_page_resources(page: Page) -> None:
+    """Abort requests for assets and trackers the scraper never reads, keeping the HTTP cache enabled."""
+    await block_unused_resources(page)
+    # Routing turns off Chromium's HTTP cache; re-enable it so scripts are reused across navigations
+    cdp_session = await page.context.new_cdp_session(page)
+    await cdp_session.send("Network.setCacheDisabled", {"cacheDisabled": False})
 
-class ProxyConfig:
-    """Class to handle proxy configuration from environment variables."""
+class ScraperSession:
+    """Async context manager owning a browser context on the shared browser for one scraping run."""
     def __init__(self):
-        self.server = os.getenv('PROXY_SERVER')
-        self.username = os.getenv('PROXY_USERNAME')
-        self.password = os.getenv('PROXY_PASSWORD')
-        self.bypass = os.getenv('PROXY_BYPASS')
-    
-    def get_proxy_settings(self) -> Optional[Dict]:
-        if not self.server: 
-            return None
-        proxy_settings = {"server": self.server}
-        if self.username and self.password:
-            proxy_settings.update({"username": self.username, "password": self.password})
-        if self.bypass:
-            proxy_settings["bypass"] = self.bypass
-        return proxy_settings
-    
-    @property
-    def is_configured(self) -> bool:
-        return bool(self.server)
-
-async def setup_browser():
-    """Initialize and return browser and page objects with optional proxy."""
-    p = await async_playwright().start()
-    browser_settings = {"headless": False}
-    proxy_config = ProxyConfig()
-    if proxy_config.is_configured:
-        proxy_settings = proxy_config.get_proxy_settings()
-        if proxy_settings:
-            browser_settings["proxy"] = proxy_settings
-    browser = await p.chromium.launch(**browser_settings)
-    page = await browser.new_page(viewport={"width": 1280, "height": 900})
-    return p, browser, page
-
-async def extract_flight_element_text(flight, selector: str, aria_label: Optional[str] = None) -> str:
-    """Extract text from a flight element using selector and optional aria-label."""
-    if aria_label:
-        element = await flight.query_selector(f':scope {selector}[aria-label*="{aria_label}"]')
-    else:
-        element = await flight.query_selector(f':scope {selector}')
-    return await element.inner_text() if element else "N/A"
-
-async def scrape_flight_info(flight) -> Dict[str, str]:
-    """Extract all relevant information from a single flight element."""
-    departure_time = await extract_flight_element_text(flight, 'span', "Departure time")
-    arrival_time = await extract_flight_element_text(flight, 'span', "Arrival time")
-    airline = await extract_flight_element_text(flight, ".sSHqwe")
-    duration = await extract_flight_element_text(flight, "div.gvkrdb")
-    stops = await extract_flight_element_text(flight, "div.EfT7Ae span.ogfYpf")
-    price = await extract_flight_element_text(flight, "div.FpEdX span")
-    co2_emissions = await extract_flight_element_text(flight, "div.O7CXue")
-    emissions_variation = await extract_flight_element_text(flight, "div.N6PNV")
-    
-    return {
-        "Departure Time": departure_time,
-        "Arrival Time": arrival_time,
-        "Airline Company": airline,
-        "Flight Duration": duration,
-        "Stops": stops,
-        "Price": price,
-        "co2 emissions": co2_emissions,
-        "emissions variation": emissions_variation
-    }
+        self.browser = None
+        self.context = None
+        self.page: Optional[Page] = None
+
+    async def __aenter__(self) -> "ScraperSession":
+        self.browser = await BROWSER_POOL.get_browser()
+        self.context = await new_scraper_context(self.browser)
+        try:
+            self.page = await self.context.new_page()
+            await block_page_resources(self.page)
+        except BaseException:
+            await self.context.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        # Only this session's context; the browser stays up for the next one
+        await self.context.close()
+
+def get_included_fields() -> Dict[str, str]:
+    """Return the selectors of the fields to scrape, limited by the comma-separated INCLUDE_FIELDS env var."""
+    include = os.getenv('INCLUDE_FIELDS')
+    if not include:
+        return FLIGHT_FIELD_SELECTORS
+    names = [name.strip() for name in include.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FLIGHT_FIELD_SELECTORS]
+    if unknown:
+        raise ValueError(f"Unknown INCLUDE_FIELDS entries {unknown}; expected any of {list(FLIGHT_FIELD_SELECTORS)}")
+    return {name: FLIGHT_FIELD_SELECTORS[name] for name in names}
+
+# Only the requested fields are read inside the browser
+INCLUDED_FIELD_SELECTORS = get_included_fields()
+
+# Tags a card as it is scraped, so its removal after the click can be awaited without holding an element handle
+CLICKED_CARD_ATTR = "data-scraper-clicked"
+# Any tag left behind by an earlier click is cleared so only the current card carries one
+MARK_CLICKED_JS = f"""(el, token) => {{
+    document.querySelectorAll('[{CLICKED_CARD_ATTR}]').forEach(card => card.removeAttribute('{CLICKED_CARD_ATTR}'));
+    el.setAttribute('{CLICKED_CARD_ATTR}', token);
+}}"""
+SCRAPE_AND_MARK_JS = f"""(el, args) => {{
+    ({MARK_CLICKED_JS})(el, args.token);
+    return ({FLIGHT_INFO_JS})(el, args.fields);
+}}"""
+CLEAR_CLICKED_JS = f"() => document.querySelectorAll('[{CLICKED_CARD_ATTR}]').forEach(card => card.removeAttribute('{CLICKED_CARD_ATTR}'))"
+
+async def clear_clicked_tags(page: Page) -> None:
+    """Remove the click tag from every card after a failed click, ignoring a page that is mid-navigation."""
+    try:
+        await page.evaluate(CLEAR_CLICKED_JS)
+    except Exception:
+        pass
+
+def clicked_card_selector(token: str) -> str:
+    """Selector for the card tagged with the given click token."""
+    return f'[{CLICKED_CARD_ATTR}="{token}"]'
+
+async def scrape_and_mark_flight(flight: Locator, token: str) -> Dict[str, str]:
+    """Extract a card's information and tag it with the click token, in one call."""
+    return await flight.evaluate(SCRAPE_AND_MARK_JS, {"fields": INCLUDED_FIELD_SELECTORS, "token": token})
+
+def _field_locators(root: Locator) -> Dict[str, Locator]:
+    """Build the per-field locators of a card once; they resolve lazily, re-querying if the card re-renders."""
+    return {name: root.locator(selector).first for name, selector in INCLUDED_FIELD_SELECTORS.items()}
+
+async def scrape_flight_info_by_field(root: Locator) -> Dict[str, str]:
+    """Read a card field by field through locators; slower than scrape_and_mark_flight but survives a re-render."""
+    flight_info = {}
+    for name, locator in _field_locators(root).items():
+        flight_info[name] = await locator.inner_text() if await locator.count() else "N/A"
+    return flight_info
+
+async def scrape_flight_list(page: Page, selector: str) -> List[Dict[str, str]]:
+    """Extract the information of every flight element matching selector in one call."""
+    return await page.eval_on_selector_all(selector, FLIGHT_LIST_JS, INCLUDED_FIELD_SELECTORS)
+
+# Google Flights loads results through these RPC endpoints
+FLIGHT_RPC_URL_MARKERS = ("batchexecute", "GetShoppingResults")
+
+def is_flight_rpc_url(url: str) -> bool:
+    """Check whether a request URL is one of the Google Flights results RPCs."""
+    return any(marker in url for marker in FLIGHT_RPC_URL_MARKERS)
+
+# The shopping-results RPC answers a card click with its return flights; other batchexecute calls are telemetry and prefetches
+RETURN_FLIGHTS_RPC_MARKER = "GetShoppingResults"
+
+def is_return_flights_rpc(response) -> bool:
+    """Check whether a response is the shopping-results RPC, by its URL path, rpcids parameter, or request body."""
+    if not is_flight_rpc_url(response.url):
+        return False
+    parts = urlsplit(response.url)
+    if RETURN_FLIGHTS_RPC_MARKER in parts.path or RETURN_FLIGHTS_RPC_MARKER in dict(parse_qsl(parts.query)).get('rpcids', ''):
+        return True
+    try:
+        post_data = response.request.post_data or ''
+    except Exception:
+        # Bodies that are not valid UTF-8 cannot be the form-encoded RPC request
+        return False
+    return RETURN_FLIGHTS_RPC_MARKER in post_data
+
+def parse_batchexecute(body: bytes) -> List[Any]:
+    """Decode a Google RPC response body into its inner JSON payloads."""
+    if body.startswith(b")]}'"):
+        body = body[4:]
+    payloads = []
+    for line in body.splitlines():
+        # Chunked responses interleave length lines with the JSON chunks
+        if not line.startswith(b'['):
+            continue
+        try:
+            chunk = json_loads(line)
+        except ValueError:
+            continue
+        for entry in chunk:
+            if isinstance(entry, list) and len(entry) > 2 and entry[0] == "wrb.fr" and isinstance(entry[2], str):
+                payloads.append(json_loads(entry[2]))
+    return payloads
+
+class FlightRpcCapture:
+    """Collects decoded Google Flights RPC payloads, grouped by the outbound flight being scraped."""
+    def __init__(self):
+        self.current_index: Dict[Page, int] = {}
+        self.payloads: Dict[str, List[Any]] = {}
+
+    def attach(self, page: Page) -> None:
+        page.on("response", lambda response: self._on_response(page, response))
+
+    async def _on_response(self, page: Page, response) -> None:
+        if not is_flight_rpc_url(response.url):
+            return
+        try:
+            decoded = parse_batchexecute(await response.body())
+        except Exception as e:
+            print(f"   -> Could not decode RPC response: {e}")
+            return
+        index = self.current_index.get(page)
+        key = "search" if index is None else str(index)
+        self.payloads.setdefault(key, []).extend(decoded)
+
+# Directory holding cached RPC responses and how long they stay fresh (prices move)
+RPC_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+RPC_CACHE_TTL_SECONDS = 15 * 60
+
+# Per-session values Google adds to RPC requests that do not change the response
+VOLATILE_RPC_PARAMS = {'_reqid', 'f.sid', 'bl', 'at'}
+
+class RpcResponseCache:
+    """Serves Google Flights RPC responses from disk and stores the ones fetched live."""
+    def __init__(self, cache_dir: str = RPC_CACHE_DIR, read_cached: bool = True, ttl_seconds: float = RPC_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.read_cached = read_cached
+        self.ttl_seconds = ttl_seconds
+
+    async def attach(self, page: Page) -> None:
+        await page.route(is_flight_rpc_url, self._handle_route)
+
+    def _cache_path(self, url: str, post_data: Optional[str]) -> str:
+        parts = urlsplit(url)
+        query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k not in VOLATILE_RPC_PARAMS])
+        body = urlencode([(k, v) for k, v in parse_qsl(post_data or '') if k not in VOLATILE_RPC_PARAMS])
+        key = hashlib.sha256((urlunsplit(parts._replace(query=query)) + body).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    async def _handle_route(self, route) -> None:
+        # Every path must settle the route, or the page stalls until the action waiting on it times out
+        fetched = False
+        try:
+            path = self._cache_path(route.request.url, route.request.post_data)
+            if self.read_cached and os.path.exists(path) and time.time() - os.path.getmtime(path) < self.ttl_seconds:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                await route.fulfill(status=200, body=body, content_type='application/json; charset=utf-8')
+                return
+            fetched = True
+            response = await route.fetch()
+            body = await response.body()
+            if response.ok:
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(body)
+                except OSError as e:
+                    print(f"   -> Could not cache RPC response: {e}")
+            await route.fulfill(response=response, body=body)
+        except Exception as e:
+            print(f"   -> RPC cache failed, {'aborting' if fetched else 'passing through'} the request: {e}")
+            try:
+                # Once fetched, the request has gone out; continuing would send it a second time
+                await (route.abort() if fetched else route.continue_())
+            except Exception:
+                pass  # Already handled, or the page is gone
 
 # ----------------------------
-# 3. MAIN SCRAPING LOGIC
+# 2. MAIN SCRAPING LOGIC
 # ----------------------------
 
-async def scrape_round_trip_data(round_trip_url) -> FinalFlightData:
+# Define selectors
+RETURN_FLIGHT_ITEM_SELECTOR = ".pIav2d" 
+
+# Number of workers scraping outbound flights concurrently, each in its own browser context
+PAGE_POOL_SIZE = 4
+
+# Caps navigations and clicks in flight at once across all pages to stay under Google's rate limits
+BROWSER_SEM = asyncio.BoundedSemaphore(int(os.getenv('MAX_PARALLEL', '4')))
+
+async def return_to_outbound_results(page: Page, results_url: str, outbound_selector: str) -> None:
+    """Dismiss the return-flight panel to get back to the outbound list, reloading the search only as a last resort."""
+    if page.url == results_url:
+        return
+    async with BROWSER_SEM:
+        await show_outbound_results(page, results_url, outbound_selector)
+
+async def scrape_outbound_flights(page: Page, results_url: str, indices: List[int], fingerprints: List[tuple],
+                                  results: asyncio.Queue, rpc_capture: Optional[FlightRpcCapture] = None) -> None:
     """
-    Scrapes round-trip data using a forced reload strategy for stability.
-    Focuses on confirming selector reliability.
+    Click through the given outbound flights on a page already showing the search results.
+    fingerprints identify every outbound flight as previewed on the first page, so each is found here even if
+    this page's own load ordered the cards differently.
+    Each completed round-trip option is put on the results queue as soon as it is scraped.
     """
-    final_data: FinalFlightData = []
-    playwright, browser, page = await setup_browser()
-    
-    # Define selectors
-    OUTBOUND_FLIGHT_SELECTOR = ".pIav2d" 
-    RETURN_FLIGHT_ITEM_SELECTOR = ".pIav2d" 
+    # Outbound cards are re-resolved after every back navigation
+    outbound_cards = page.locator(OUTBOUND_FLIGHT_SELECTOR)
 
-    try:
-        # Initial navigation to get the count
-        await page.goto(round_trip_url)
-        await page.wait_for_load_state('networkidle', timeout=30000)
+    for n, i in enumerate(indices):
+        print(f"Processing outbound flight {i+1} of {len(fingerprints)}...")
         
-        await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=20000)
-        outbound_flights_list = await page.query_selector_all(OUTBOUND_FLIGHT_SELECTOR)
-        initial_outbound_count = len(outbound_flights_list)
-        print(f"Found {initial_outbound_count} initial outbound flights to process...")
-
-        # Loop using the total COUNT
-        for i in range(initial_outbound_count):
-            print(f"Processing outbound flight {i+1} of {initial_outbound_count}...")
-            
-            # CRITICAL: Reload to ensure a fresh state for the click
-            await page.goto(round_trip_url)
-            await page.wait_for_selector(OUTBOUND_FLIGHT_SELECTOR, timeout=20000)
-            await page.wait_for_load_state('domcontentloaded')
+        if rpc_capture:
+            rpc_capture.current_index[page] = i
+        
+        try:
+            # Find the previewed flight on this page before clicking anything
+            outbound_locator = await find_previewed_card(outbound_cards, i, fingerprints[i])
+            if outbound_locator is None:
+                print(f"   -> Flight {i+1} is no longer listed on this page, skipping...")
+                continue
             
-            # Define the locator for the Nth flight
-            outbound_locator = page.locator(OUTBOUND_FLIGHT_SELECTOR).nth(i)
+            # A. Bring the card into view
+            await outbound_locator.scroll_into_view_if_needed(timeout=5000)
             
+            # B. Scrape the information for the current outbound flight and tag the card for step D
+            click_token = str(i)
             try:
-                # A. Ensure the element is visible
-                await outbound_locator.scroll_into_view_if_needed(timeout=5000)
-                
-                # B. Scrape the information for the current outbound flight
-                outbound_element = await outbound_locator.element_handle()
-                outbound_info = await scrape_flight_info(outbound_element)
-                
-                # C. Click the element (robust click)
-                await outbound_locator.click(timeout=15000, force=True) 
+                outbound_info = await scrape_and_mark_flight(outbound_locator, click_token)
+            except Exception:
+                # The card re-rendered mid-evaluate; read it field by field through re-resolving locators
+                outbound_info = await scrape_flight_info_by_field(outbound_locator)
+                await outbound_locator.evaluate(MARK_CLICKED_JS, click_token)
+            
+            async with BROWSER_SEM:
+                # C. Click the element and wait for the RPC that carries its return flights
+                async with page.expect_response(is_return_flights_rpc) as response_info:
+                    await outbound_locator.click()
+                await response_info.value
                 
-                # D. Wait explicitly for the individual return flight item to appear 
+                # D. Wait for the clicked outbound list to be replaced by the return flights
                 full_return_selector = RETURN_FLIGHT_ITEM_SELECTOR
-                
-                # Wait for at least one return flight element to be present
-                await page.wait_for_selector(full_return_selector, timeout=15000) 
-                
-                # E. Scrape all visible return flights
-                return_elements = await page.query_selector_all(full_return_selector)
-                return_flights_data: List[ReturnFlightInfo] = []
-                
-                for return_element in return_elements:
-                    return_info = await scrape_flight_info(return_element)
-                    return_flights_data.append(return_info)
-                
-                # F. Store the combined data
-                if return_flights_data:
-                    final_data.append({
-                        "OutboundFlight": outbound_info,
-                        "ReturnFlights": return_flights_data
-                    })
-                    print(f"   -> SUCCESS: Found and saved {len(return_flights_data)} return flights.")
-                else:
-                    print(f"   -> Found container but **0** return flights. CHECK RETURN SELECTOR: {RETURN_FLIGHT_ITEM_SELECTOR}")
-
-            except PlaywrightTimeoutError as e:
-                print(f"Warning: TIMEOUT on flight {i+1}. Issue likely in selector or click stability. Error: {e}")
+                await page.wait_for_selector(clicked_card_selector(click_token), state='detached')
+                await wait_for_flight_results(page, full_return_selector, timeout=15000)
+            
+            # E. Scrape all visible return flights
+            return_flights_data: List[ReturnFlightInfo] = await scrape_flight_list(page, full_return_selector)
+            
+            # F. Store the combined data
+            if return_flights_data:
+                await results.put({
+                    "OutboundFlight": outbound_info,
+                    "ReturnFlights": return_flights_data
+                })
+                print(f"   -> SUCCESS: Found and saved {len(return_flights_data)} return flights for flight {i+1}.")
+            else:
+                print(f"   -> Found container but **0** return flights. CHECK RETURN SELECTOR: {RETURN_FLIGHT_ITEM_SELECTOR}")
+
+        except PlaywrightTimeoutError as e:
+            print(f"Warning: TIMEOUT on flight {i+1}. Issue likely in selector or click stability. Error: {e}")
+            await clear_clicked_tags(page)
+        except Exception as e:
+            print(f"Warning: Failed to process flight {i+1}. General Error: {e}")
+            await clear_clicked_tags(page)
+
+        # G. Back to the outbound list for the next flight
+        if n < len(indices) - 1:
+            try:
+                await return_to_outbound_results(page, results_url, OUTBOUND_FLIGHT_SELECTOR)
             except Exception as e:
-                print(f"Warning: Failed to process flight {i+1}. General Error: {e}")
+                print(f"Warning: Could not get back to the outbound list after flight {i+1}, stopping this worker. Error: {e}")
+                break
+
+async def instrument_page(page: Page, rpc_capture: Optional[FlightRpcCapture] = None,
+                          rpc_cache: Optional[RpcResponseCache] = None) -> None:
+    """Hook the optional RPC capture and response cache into a page before it navigates."""
+    if rpc_capture:
+        rpc_capture.attach(page)
+    if rpc_cache:
+        await rpc_cache.attach(page)
+
+async def open_results_page(browser, results_url: str, rpc_capture: Optional[FlightRpcCapture] = None,
+                            rpc_cache: Optional[RpcResponseCache] = None) -> Page:
+    """Open the search results in a new context of the shared browser for a parallel worker."""
+    context = await new_scraper_context(browser)
+    try:
+        page = await context.new_page()
+        await block_page_resources(page)
+        await instrument_page(page, rpc_capture, rpc_cache)
+        async with BROWSER_SEM:
+            await page.goto(results_url, wait_until='domcontentloaded')
+            await wait_for_flight_results(page)
+    except BaseException:
+        # The caller never gets the page, so nobody else could close this context
+        await context.close()
+        raise
+    return page
+
+async def scrape_round_trip_data(round_trip_url, rpc_capture: Optional[FlightRpcCapture] = None,
+                                 rpc_cache: Optional[RpcResponseCache] = None) -> AsyncIterator[RoundTripOption]:
+    """
+    Scrapes round-trip data by loading the search once per worker and clicking through each outbound flight.
+    Outbound flights are split round-robin over PAGE_POOL_SIZE pages scraped concurrently,
+    and each round-trip option is yielded as soon as a worker finishes it.
+    If rpc_capture is given, the backend RPC payloads behind each click are collected into it.
+    If rpc_cache is given, RPC responses are replayed from and saved to disk.
+    """
+    async with ScraperSession() as session:
+        async for option in scrape_with_session(session, round_trip_url, rpc_capture, rpc_cache):
+            yield option
+
+async def scrape_with_session(session: ScraperSession, round_trip_url, rpc_capture: Optional[FlightRpcCapture] = None,
+                              rpc_cache: Optional[RpcResponseCache] = None) -> AsyncIterator[RoundTripOption]:
+    """Run the round-trip scrape on an already open ScraperSession."""
+    page = session.page
+    workers_task: Optional[asyncio.Task] = None
+    await instrument_page(page, rpc_capture, rpc_cache)
+
+    try:
+        # Initial navigation to get the count; this page also becomes the first worker
+        async with BROWSER_SEM:
+            await page.goto(round_trip_url, wait_until='domcontentloaded')
+            await wait_for_flight_results(page)
+        # Read every card's identifying fields once; the other workers match their own cards against these
+        outbound_previews = await page.locator(OUTBOUND_FLIGHT_SELECTOR).evaluate_all(FLIGHT_LIST_JS, FINGERPRINT_SELECTORS)
+        outbound_fingerprints = [flight_fingerprint(info) for info in outbound_previews]
+        initial_outbound_count = len(outbound_fingerprints)
+        print(f"Found {initial_outbound_count} initial outbound flights to process...")
+
+        # Google may redirect the generated URL, so go back to wherever the results landed
+        results_url = page.url
+
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def run_workers() -> None:
+            # Distribute outbound indices round-robin over the worker pages
+            worker_pages: List[Page] = []
+            try:
+                worker_count = max(1, min(PAGE_POOL_SIZE, initial_outbound_count))
+                # Let every open finish so the pages that did open are closed below even if another failed
+                opened = await asyncio.gather(
+                    *[open_results_page(session.browser, results_url, rpc_capture, rpc_cache) for _ in range(worker_count - 1)],
+                    return_exceptions=True
+                )
+                worker_pages = [result for result in opened if not isinstance(result, BaseException)]
+                for result in opened:
+                    if isinstance(result, BaseException):
+                        raise result
+                await asyncio.gather(*[
+                    scrape_outbound_flights(worker_page, results_url, list(range(w, initial_outbound_count, worker_count)),
+                                            outbound_fingerprints, results, rpc_capture)
+                    for w, worker_page in enumerate([page] + worker_pages)
+                ])
+            finally:
+                # Sentinel: no more round-trip options are coming
+                await results.put(None)
+                # Only the extra workers' contexts; the session closes its own
+                for worker_page in worker_pages:
+                    await worker_page.context.close()
+
+        workers_task = asyncio.create_task(run_workers())
+        scraped_count = 0
+        while (option := await results.get()) is not None:
+            scraped_count += 1
+            yield option
+        await workers_task
                 
-        print(f"\nSuccessfully scraped {len(final_data)} complete round-trip options.")
-        return final_data
+        print(f"\nSuccessfully scraped {scraped_count} complete round-trip options.")
 
     finally:
-        await browser.close()
-        await playwright.stop()
+        if workers_task and not workers_task.done():
+            workers_task.cancel()
+            # Let the workers close their contexts before the session and the browser go away
+            await asyncio.gather(workers_task, return_exceptions=True)
 
 # ----------------------------
-# 4. DATA SAVING FUNCTIONS
+# 3. DATA SAVING FUNCTIONS
 # ----------------------------
 
+async def stream_to_jsonl(records: AsyncIterator[RoundTripOption], filename: str) -> int:
+    """Write each round-trip option to a JSON Lines file as it is scraped, returning how many were written."""
+    count = 0
+    with open(filename, 'wb') as f:
+        async for record in records:
+            f.write(dump_json_line(record))
+            # Flush per record so a crash mid-run keeps everything scraped so far
+            f.flush()
+            count += 1
+    if count:
+        print(f"Round-trip data streamed to {filename}")
+    else:
+        print("No data was scraped to save.")
+    return count
+
+def save_parquet(jsonl_filename: str, parquet_filename: str) -> None:
+    """Flatten streamed round-trip options into one row per return flight and save them as Parquet."""
+    with open(jsonl_filename, 'rb') as f:
+        records = [json_loads(line) for line in f if line.strip()]
+    if not records:
+        print("No data was scraped to save.")
+        return
+    # Imported here so JSON-only runs and modules reusing this one do not pay for pandas
+    import pandas as pd
+    outbound_fields = list(records[0]["OutboundFlight"])
+    df = pd.json_normalize(
+        records,
+        record_path='ReturnFlights',
+        meta=[['OutboundFlight', field] for field in outbound_fields],
+        record_prefix='ReturnFlight.'
+    )
+    df.to_parquet(parquet_filename, engine='pyarrow', compression='zstd', index=False)
+    print(f"Flattened round-trip data saved to {parquet_filename}")
+
 def save_structured_data(data: FinalFlightData, filename: str) -> None:
     """Save the nested flight data structure as a JSON file."""
     if data:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
+        write_json(data, filename)
         print(f"Nested round-trip data saved to {filename}")
     else:
         print("No data was scraped to save.")
 
 # ----------------------------
-# 5. MAIN EXECUTION
+# 4. MAIN EXECUTION
 # ----------------------------
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape round-trip flight options from Google Flights.")
+    parser.add_argument('--no-cache', action='store_true', help="Always fetch live results instead of replaying cached RPC responses")
+    parser.add_argument('--parquet', action='store_true', help="Also save a flattened Parquet copy of the results")
+    args = parser.parse_args()
+
     print("Starting Dynamic Round-Trip Scraper...")
     
     # Configure your flight search parameters here
@@ -237,9 +505,16 @@ if __name__ == "__main__":
     print(f"Departure: {DEPARTURE_DATE}, Return: {RETURN_DATE}")
     print("Generated URL:", round_trip_url)
     
-    # Run the scraper
-    scraped_data = asyncio.run(scrape_round_trip_data(round_trip_url))
-    
-    # Save the structured data
-    output_filename = f"round_trip_{DEPARTURE}_{DESTINATION}_{DEPARTURE_DATE.replace('-', '')}.json"
-    save_structured_data(scraped_data, output_filename)
\ No newline at end of file
+    # Run the scraper, streaming each round-trip option to disk as it is scraped
+    rpc_capture = FlightRpcCapture()
+    rpc_cache = RpcResponseCache(read_cached=not args.no_cache)
+    output_filename = f"round_trip_{DEPARTURE}_{DESTINATION}_{DEPARTURE_DATE.replace('-', '')}.jsonl"
+    scraped_count = asyncio.run(run_and_shutdown(
+        stream_to_jsonl(scrape_round_trip_data(round_trip_url, rpc_capture, rpc_cache), output_filename)
+    ))
+    if args.parquet and scraped_count:
+        save_parquet(output_filename, output_filename.replace('.jsonl', '.parquet'))
+
+    # Save the raw backend payloads alongside the DOM-scraped data
+    if rpc_capture.payloads:
+        save_structured_data(rpc_capture.payloads, output_filename.replace('.jsonl', '_rpc.json'))
\ No newline at end of file
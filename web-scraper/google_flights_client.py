@@ -0,0 +1,43 @@
+import asyncio
+import json
+from typing import List
+import httpx
+from flight_core import FlightURLBuilder, ProxyConfig, create_http_client, parse_flight_cards, FlightInfo, SearchQuery
+
+# ----------------------------
+# 1. SEARCH FUNCTIONS
+# ----------------------------
+
+async def search_round_trip(session: httpx.AsyncClient, departure: str, destination: str, departure_date: str, return_date: str) -> List[FlightInfo]:
+    """
+    Fetch the server-rendered results of a round-trip search without a browser.
+    Returns the outbound flight options; an empty list means the page needs the browser scraper.
+    """
+    url = FlightURLBuilder.build_round_trip_url(departure, destination, departure_date, return_date)
+    response = await session.get(url, params={"hl": "en"})
+    response.raise_for_status()
+    return parse_flight_cards(response.text)
+
+async def search_round_trips(queries: List[SearchQuery]) -> List[List[FlightInfo]]:
+    """Run several round-trip searches concurrently over one shared client."""
+    async with create_http_client(ProxyConfig()) as session:
+        return await asyncio.gather(*(search_round_trip(session, **query) for query in queries))
+
+# ----------------------------
+# 2. MAIN EXECUTION
+# ----------------------------
+
+if __name__ == "__main__":
+    print("Starting HTTP Round-Trip Search...")
+
+    # Configure your flight searches here
+    QUERIES = [
+        {"departure": "LAX", "destination": "SFO", "departure_date": "2026-12-07", "return_date": "2026-12-12"},
+        {"departure": "SFO", "destination": "LAX", "departure_date": "2026-12-07", "return_date": "2026-12-12"}
+    ]
+
+    results = asyncio.run(search_round_trips(QUERIES))
+    for query, flights in zip(QUERIES, results):
+        print(f"{query['departure']} -> {query['destination']}: {len(flights)} outbound flights")
+        if flights:
+            print(json.dumps(flights[0], indent=4))